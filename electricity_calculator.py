@@ -1,9 +1,8 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import json
+import orjson
+import uuid
 
 # Page configuration
 st.set_page_config(
@@ -14,90 +13,221 @@ st.set_page_config(
 )
 
 # Initialize session state
+# usage_data maps "YYYY-MM-DD" -> usage entry
 if 'usage_data' not in st.session_state:
-    st.session_state.usage_data = []
+    st.session_state.usage_data = {}
 
 if 'user_profile' not in st.session_state:
     st.session_state.user_profile = {}
 
+# Scopes this session's entries in st.cache_data, which is shared by all sessions
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Chart styling, shared by every rerun
+_ENERGY_LABELS = {'total_energy': 'Energy (kWh)', 'date': 'Date'}
+_DAILY_BAR_ARGS = dict(labels=_ENERGY_LABELS, color_discrete_sequence=['#4C78A8'])
+_TREND_LINE_ARGS = dict(labels=_ENERGY_LABELS, markers=True)
+_DAILY_LAYOUT = dict(
+    title='Daily Electricity Consumption',
+    xaxis_title='Date',
+    yaxis_title='Energy (kWh)',
+    height=400
+)
+_TREND_LAYOUT = dict(
+    title='Weekly Electricity Consumption Trend',
+    xaxis_title='Date',
+    yaxis_title='Energy (kWh)',
+    height=400
+)
+_PIE_LAYOUT = dict(title='Energy Consumption Breakdown (Latest Day)')
+
+# Flattened usage entry columns -> export headers, in export order
+_EXPORT_COLUMNS = {
+    'date': 'Date',
+    'total_energy': 'Total Energy (kWh)',
+    'cost': 'Cost (₹)',
+    'user_data.name': 'Name',
+    'user_data.city': 'City',
+    'user_data.facility': 'Housing Type',
+    'user_data.ac': 'AC',
+    'user_data.fridge': 'Fridge',
+    'user_data.washing_machine': 'Washing Machine',
+    'user_data.tv': 'TV',
+    'user_data.microwave': 'Microwave',
+    'user_data.water_heater': 'Water Heater'
+}
+
+# Base consumption (lighting & fans) per housing type, in kWh per day
+_BASE_KWH = {
+    "1bhk": 2 * 0.4 + 2 * 0.8,  # 2.4 kWh
+    "2bhk": 3 * 0.4 + 3 * 0.8,  # 3.6 kWh
+    "3bhk": 4 * 0.4 + 4 * 0.8   # 4.8 kWh
+}
+
+# Appliance consumption in kWh per day
+_APPLIANCE_KWH = {
+    "ac": 1.5 * 8,               # AC: 1.5 kWh per hour, assuming 8 hours usage
+    "fridge": 0.15 * 24,         # Fridge: 0.15 kWh per hour, 24 hours
+    "washing_machine": 2,        # Washing Machine: 2 kWh per cycle, assuming 1 cycle
+    "tv": 0.15 * 6,              # TV: 0.15 kWh per hour, assuming 6 hours
+    "microwave": 1.2 * 0.5,      # Microwave: 1.2 kWh per hour, assuming 0.5 hours
+    "water_heater": 2 * 2        # Water Heater: 2 kWh per hour, assuming 2 hours
+}
+
+# (appliance key, checkbox label) in the order the checkboxes are shown
+_APPLIANCE_UI = (
+    ('ac', 'Air Conditioner (AC)'),
+    ('fridge', 'Refrigerator'),
+    ('washing_machine', 'Washing Machine'),
+    ('tv', 'Television'),
+    ('microwave', 'Microwave'),
+    ('water_heater', 'Water Heater')
+)
+
+# (chart label, appliance key, kWh per day) for the appliance breakdown
+_APPLIANCE_PAIRS = tuple(
+    (label, key, _APPLIANCE_KWH[key])
+    for label, key in (
+        ('AC', 'ac'),
+        ('Fridge', 'fridge'),
+        ('Washing Machine', 'washing_machine'),
+        ('TV', 'tv'),
+        ('Microwave', 'microwave'),
+        ('Water Heater', 'water_heater')
+    )
+)
+
 def calculate_base_energy(facility):
     """Calculate base energy consumption based on facility type"""
-    base_consumption = {
-        "1bhk": 2 * 0.4 + 2 * 0.8,  # 2.4 kWh
-        "2bhk": 3 * 0.4 + 3 * 0.8,  # 3.6 kWh
-        "3bhk": 4 * 0.4 + 4 * 0.8   # 4.8 kWh
-    }
-    return base_consumption.get(facility.lower(), 0)
+    return _BASE_KWH.get(facility.lower(), 0)
 
-def calculate_appliance_energy(ac, fridge, washing_machine, tv, microwave, water_heater):
+def calculate_appliance_energy(flags):
     """Calculate energy consumption from appliances"""
-    appliance_consumption = 0
-    
-    # AC: 1.5 kWh per hour, assuming 8 hours usage
-    if ac:
-        appliance_consumption += 1.5 * 8
-    
-    # Fridge: 0.15 kWh per hour, 24 hours
-    if fridge:
-        appliance_consumption += 0.15 * 24
-    
-    # Washing Machine: 2 kWh per cycle, assuming 1 cycle
-    if washing_machine:
-        appliance_consumption += 2
-    
-    # TV: 0.15 kWh per hour, assuming 6 hours
-    if tv:
-        appliance_consumption += 0.15 * 6
-    
-    # Microwave: 1.2 kWh per hour, assuming 0.5 hours
-    if microwave:
-        appliance_consumption += 1.2 * 0.5
-    
-    # Water Heater: 2 kWh per hour, assuming 2 hours
-    if water_heater:
-        appliance_consumption += 2 * 2
-    
-    return appliance_consumption
+    return sum(v for k, v in _APPLIANCE_KWH.items() if flags.get(k))
 
-def save_daily_usage(total_energy, user_data):
+def save_daily_usage(total_energy, user_data, now=None):
     """Save daily usage data"""
-    today = datetime.now().strftime("%Y-%m-%d")
+    if now is None:
+        now = datetime.now()
     
     usage_entry = {
-        "date": today,
+        "date": pd.Timestamp(now).normalize(),
         "total_energy": total_energy,
         "user_data": user_data,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now.isoformat()
     }
     
-    # Check if today's data already exists
-    existing_index = None
-    for i, entry in enumerate(st.session_state.usage_data):
-        if entry["date"] == today:
-            existing_index = i
-            break
+    # Insert or replace today's entry
+    st.session_state.usage_data[usage_entry["date"].strftime("%Y-%m-%d")] = usage_entry
+
+# Shared by all sessions and re-keyed on every save, so keep the cache bounded
+@st.cache_data(max_entries=128)
+def _build_weekly(records_tuple):
+    """Build the sorted weekly DataFrame from (date, total_energy) pairs"""
+    df = pd.DataFrame(list(records_tuple), columns=['date', 'total_energy'])
     
-    if existing_index is not None:
-        st.session_state.usage_data[existing_index] = usage_entry
-    else:
-        st.session_state.usage_data.append(usage_entry)
+    weekly_data = df.sort_values('date')
+    return weekly_data
 
-def get_weekly_data():
+def get_weekly_data(now=None):
     """Get data for the last 7 days"""
     if not st.session_state.usage_data:
         return pd.DataFrame()
     
-    df = pd.DataFrame(st.session_state.usage_data)
-    df['date'] = pd.to_datetime(df['date'])
+    if now is None:
+        now = datetime.now()
     
-    # Get last 7 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=7)
+    # Get last 7 days; ISO date keys sort chronologically, so filter on the strings
+    cutoff = (now - timedelta(days=7)).strftime("%Y-%m-%d")
+    records = tuple(
+        (e["date"], e["total_energy"]) for d, e in st.session_state.usage_data.items() if d > cutoff
+    )
+    if not records:
+        return pd.DataFrame()
     
-    weekly_data = df[df['date'] >= start_date].sort_values('date')
-    return weekly_data
+    # Hashable snapshot of the window so the cached frame is reused until it changes
+    return _build_weekly(records)
+
+# Chart builders import plotly lazily so a first visit with no history never loads it.
+# Built figures are reused per session through _session_figure.
+
+def _daily_figure(dates, values):
+    """Build the daily consumption bar chart"""
+    import plotly.express as px
+    
+    fig = px.bar(
+        pd.DataFrame({'date': dates, 'total_energy': values}), 
+        x='date', 
+        y='total_energy',
+        **_DAILY_BAR_ARGS
+    )
+    fig.update_layout(**_DAILY_LAYOUT)
+    return fig
+
+def _trend_figure(dates, values):
+    """Build the weekly trend line chart"""
+    import plotly.express as px
+    
+    fig = px.line(
+        pd.DataFrame({'date': dates, 'total_energy': values}), 
+        x='date', 
+        y='total_energy',
+        **_TREND_LINE_ARGS
+    )
+    fig.update_layout(**_TREND_LAYOUT)
+    return fig
+
+def _pie_figure(names, values):
+    """Build the appliance breakdown pie chart"""
+    import plotly.express as px
+    
+    fig = px.pie(values=list(values), names=list(names))
+    fig.update_layout(**_PIE_LAYOUT)
+    return fig
+
+def _weekly_signature(weekly_data):
+    """Content signature of the plotted weekly series"""
+    return hash((
+        weekly_data['date'].to_numpy().tobytes(),
+        weekly_data['total_energy'].to_numpy().tobytes()
+    ))
+
+def _session_figure(name, sig, builder, *args):
+    """Reuse this session's last figure for a chart while its content signature is unchanged"""
+    cached = st.session_state.get(f'_fig_{name}')
+    if cached is None or cached[0] != sig:
+        cached = (sig, builder(*args))
+        st.session_state[f'_fig_{name}'] = cached
+    return cached[1]
+
+# Each save creates a new export key, so bound how many serialized histories are kept
+_EXPORT_CACHE_ENTRIES = 64
+
+@st.cache_data(max_entries=_EXPORT_CACHE_ENTRIES)
+def _csv_bytes(_entries, history_key):
+    """Serialize the usage history to CSV (cached on history_key, not the entries)"""
+    export_df = pd.json_normalize(_entries)
+    export_df['cost'] = export_df['total_energy'].to_numpy() * 6.0
+    export_df = export_df[list(_EXPORT_COLUMNS)].rename(columns=_EXPORT_COLUMNS)
+    return export_df.to_csv(index=False).encode()
+
+def _json_default(obj):
+    """Serialize entry dates (pd.Timestamp) as plain YYYY-MM-DD strings"""
+    if isinstance(obj, pd.Timestamp):
+        return obj.strftime("%Y-%m-%d")
+    raise TypeError
+
+@st.cache_data(max_entries=_EXPORT_CACHE_ENTRIES)
+def _json_bytes(_entries, history_key):
+    """Serialize the usage history to JSON (cached on history_key, not the entries)"""
+    return orjson.dumps(_entries, default=_json_default, option=orjson.OPT_INDENT_2)
 
 # Main UI
+# Resolve the current time once per rerun and reuse it everywhere below
+_now = datetime.now()
+_stamp = _now.strftime("%Y%m%d")
+
 st.title("⚡ Electricity Usage Calculator")
 st.markdown("Calculate and track your daily electricity consumption")
 
@@ -126,19 +256,15 @@ with col1:
     st.subheader("🔌 Appliances Usage")
     
     # Appliances input
-    ac = st.checkbox("Air Conditioner (AC)", value=st.session_state.user_profile.get('ac', False))
-    fridge = st.checkbox("Refrigerator", value=st.session_state.user_profile.get('fridge', False))
-    washing_machine = st.checkbox("Washing Machine", value=st.session_state.user_profile.get('washing_machine', False))
-    tv = st.checkbox("Television", value=st.session_state.user_profile.get('tv', False))
-    microwave = st.checkbox("Microwave", value=st.session_state.user_profile.get('microwave', False))
-    water_heater = st.checkbox("Water Heater", value=st.session_state.user_profile.get('water_heater', False))
+    profile = st.session_state.user_profile
+    flags = {key: st.checkbox(label, value=profile.get(key, False)) for key, label in _APPLIANCE_UI}
 
 with col2:
     st.subheader("📊 Today's Calculation")
     
     # Calculate energy consumption
     base_energy = calculate_base_energy(facility)
-    appliance_energy = calculate_appliance_energy(ac, fridge, washing_machine, tv, microwave, water_heater)
+    appliance_energy = calculate_appliance_energy(flags)
     total_energy = base_energy + appliance_energy
     
     # Display breakdown
@@ -160,19 +286,14 @@ if st.button("💾 Save Today's Usage", type="primary"):
             'area': area,
             'flat_tenement': flat_tenement,
             'facility': facility,
-            'ac': ac,
-            'fridge': fridge,
-            'washing_machine': washing_machine,
-            'tv': tv,
-            'microwave': microwave,
-            'water_heater': water_heater
+            **flags
         }
         
         # Update session state
         st.session_state.user_profile = user_data
         
         # Save usage data
-        save_daily_usage(total_energy, user_data)
+        save_daily_usage(total_energy, user_data, now=_now)
         st.success("✅ Usage data saved successfully!")
     else:
         st.error("❌ Please enter your name first!")
@@ -181,88 +302,73 @@ if st.button("💾 Save Today's Usage", type="primary"):
 st.header("📈 Usage Analytics")
 
 # Get weekly data
-weekly_data = get_weekly_data()
+weekly_data = get_weekly_data(now=_now)
 
 if not weekly_data.empty:
-    tab1, tab2, tab3 = st.tabs(["📅 Daily Usage", "📊 Weekly Trend", "🔍 Detailed Analysis"])
+    # Only the selected view is built, unlike st.tabs which runs every tab body on each rerun
+    view = st.radio("View", ["📅 Daily Usage", "📊 Weekly Trend", "🔍 Detailed Analysis"], horizontal=True)
     
-    with tab1:
+    if view == "📅 Daily Usage":
         st.subheader("Last 7 Days Usage")
         
         # Create daily usage chart
-        fig_daily = px.bar(
-            weekly_data, 
-            x='date', 
-            y='total_energy',
-            title='Daily Electricity Consumption',
-            labels={'total_energy': 'Energy (kWh)', 'date': 'Date'},
-            color='total_energy',
-            color_continuous_scale='Blues'
+        fig_daily = _session_figure(
+            'daily', _weekly_signature(weekly_data), _daily_figure,
+            tuple(weekly_data['date']), tuple(weekly_data['total_energy'])
         )
-        fig_daily.update_layout(height=400)
-        st.plotly_chart(fig_daily, use_container_width=True)
+        st.plotly_chart(fig_daily, key="daily_bar", use_container_width=True)
         
         # Display data table
         display_data = weekly_data[['date', 'total_energy']].copy()
         display_data['date'] = display_data['date'].dt.strftime('%Y-%m-%d')
-        display_data['cost'] = display_data['total_energy'] * 6
+        display_data['cost'] = display_data['total_energy'].to_numpy() * 6.0
         display_data.columns = ['Date', 'Energy (kWh)', 'Cost (₹)']
         st.dataframe(display_data, use_container_width=True)
     
-    with tab2:
+    elif view == "📊 Weekly Trend":
         st.subheader("Weekly Consumption Trend")
         
         # Line chart for trend
-        fig_trend = px.line(
-            weekly_data, 
-            x='date', 
-            y='total_energy',
-            title='Weekly Electricity Consumption Trend',
-            labels={'total_energy': 'Energy (kWh)', 'date': 'Date'},
-            markers=True
+        fig_trend = _session_figure(
+            'trend', _weekly_signature(weekly_data), _trend_figure,
+            tuple(weekly_data['date']), tuple(weekly_data['total_energy'])
         )
-        fig_trend.update_layout(height=400)
-        st.plotly_chart(fig_trend, use_container_width=True)
+        st.plotly_chart(fig_trend, key="weekly_trend", use_container_width=True)
         
         # Weekly statistics
+        energy = weekly_data['total_energy'].to_numpy()
+        total, mean, highest, lowest = energy.sum(), energy.mean(), energy.max(), energy.min()
+        
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Week", f"{weekly_data['total_energy'].sum():.2f} kWh")
+            st.metric("Total Week", f"{total:.2f} kWh")
         with col2:
-            st.metric("Average Daily", f"{weekly_data['total_energy'].mean():.2f} kWh")
+            st.metric("Average Daily", f"{mean:.2f} kWh")
         with col3:
-            st.metric("Highest Day", f"{weekly_data['total_energy'].max():.2f} kWh")
+            st.metric("Highest Day", f"{highest:.2f} kWh")
         with col4:
-            st.metric("Lowest Day", f"{weekly_data['total_energy'].min():.2f} kWh")
+            st.metric("Lowest Day", f"{lowest:.2f} kWh")
     
-    with tab3:
+    else:
         st.subheader("Detailed Analysis")
         
         # Appliance-wise breakdown (for latest entry)
         if not weekly_data.empty:
-            latest_data = weekly_data.iloc[-1]['user_data']
+            latest_date = weekly_data['date'].iloc[-1].strftime('%Y-%m-%d')
+            latest_data = st.session_state.usage_data[latest_date]['user_data']
             
-            # Create appliance breakdown
-            appliances = {
-                'AC': 12.0 if latest_data.get('ac', False) else 0,
-                'Fridge': 3.6 if latest_data.get('fridge', False) else 0,
-                'Washing Machine': 2.0 if latest_data.get('washing_machine', False) else 0,
-                'TV': 0.9 if latest_data.get('tv', False) else 0,
-                'Microwave': 0.6 if latest_data.get('microwave', False) else 0,
-                'Water Heater': 4.0 if latest_data.get('water_heater', False) else 0,
-                'Base (Lights & Fans)': calculate_base_energy(latest_data.get('facility', '1BHK'))
+            # Create appliance breakdown (only appliances that were on)
+            active_appliances = {
+                label: kwh for label, key, kwh in _APPLIANCE_PAIRS if latest_data.get(key)
             }
-            
-            # Filter out zero values
-            active_appliances = {k: v for k, v in appliances.items() if v > 0}
+            base = calculate_base_energy(latest_data.get('facility', '1BHK'))
+            if base > 0:
+                active_appliances['Base (Lights & Fans)'] = base
             
             if active_appliances:
-                fig_pie = px.pie(
-                    values=list(active_appliances.values()),
-                    names=list(active_appliances.keys()),
-                    title='Energy Consumption Breakdown (Latest Day)'
-                )
-                st.plotly_chart(fig_pie, use_container_width=True)
+                names, values = tuple(active_appliances.keys()), tuple(active_appliances.values())
+                fig_pie = _session_figure('pie', hash((names, values)), _pie_figure, names, values)
+                st.plotly_chart(fig_pie, key="appliance_pie", use_container_width=True)
         
         # Energy efficiency tips
         st.subheader("💡 Energy Efficiency Tips")
@@ -281,43 +387,26 @@ else:
 if st.session_state.usage_data:
     st.subheader("📤 Export Data")
     
-    # Prepare data for export
-    export_data = []
-    for entry in st.session_state.usage_data:
-        export_entry = {
-            'Date': entry['date'],
-            'Total Energy (kWh)': entry['total_energy'],
-            'Cost (₹)': entry['total_energy'] * 6,
-            'Name': entry['user_data']['name'],
-            'City': entry['user_data']['city'],
-            'Housing Type': entry['user_data']['facility'],
-            'AC': entry['user_data']['ac'],
-            'Fridge': entry['user_data']['fridge'],
-            'Washing Machine': entry['user_data']['washing_machine'],
-            'TV': entry['user_data']['tv'],
-            'Microwave': entry['user_data']['microwave'],
-            'Water Heater': entry['user_data']['water_heater']
-        }
-        export_data.append(export_entry)
-    
-    export_df = pd.DataFrame(export_data)
+    # Every save adds an entry or refreshes a timestamp, so this identifies the session's history
+    entries = list(st.session_state.usage_data.values())
+    history_key = (st.session_state.session_id, len(entries), max(e["timestamp"] for e in entries))
     
     col1, col2 = st.columns(2)
     with col1:
-        csv = export_df.to_csv(index=False)
+        csv = _csv_bytes(entries, history_key)
         st.download_button(
             label="📥 Download CSV",
             data=csv,
-            file_name=f"electricity_usage_{datetime.now().strftime('%Y%m%d')}.csv",
+            file_name=f"electricity_usage_{_stamp}.csv",
             mime="text/csv"
         )
     
     with col2:
-        json_data = json.dumps(st.session_state.usage_data, indent=2)
+        json_data = _json_bytes(entries, history_key)
         st.download_button(
             label="📥 Download JSON",
             data=json_data,
-            file_name=f"electricity_usage_{datetime.now().strftime('%Y%m%d')}.json",
+            file_name=f"electricity_usage_{_stamp}.json",
             mime="application/json"
         )
 